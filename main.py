@@ -1,13 +1,6 @@
 # main.py (com camada Gold: country_timeseries)
 from __future__ import annotations
 
-# --- Carrega variáveis do .env ANTES de importar módulos ---
-try:
-    from dotenv import load_dotenv
-    load_dotenv(override=True)
-except Exception:
-    pass
-
 # --- Fix de path ---
 from pathlib import Path
 import sys as _sys
@@ -18,16 +11,13 @@ if str(PROJECT_ROOT) not in _sys.path:
 import argparse
 import json
 import logging
-from datetime import date, timedelta
-import pandas as pd
+from datetime import date, datetime, timedelta
+from typing import TYPE_CHECKING
 
-from src.etl.extractor import fetch_countries
-from src.etl.writer import write_parquet, write_csv
-from src.etl.transformer import transform_countries
-from src.etl.exchangerates import fetch_timeseries
-from src.etl.transformer_rates import transform_rates
-from src.etl.transformer_enriched import enrich_countries_with_rates
-from src.etl.gold import build_gold_views
+# pandas, httpx e os módulos src.etl.* são importados só em run_pipeline:
+# `python main.py --help` não paga o custo de importá-los.
+if TYPE_CHECKING:
+    import pandas as pd
 
 logger = logging.getLogger("etl.main")
 
@@ -53,7 +43,9 @@ def parse_args() -> argparse.Namespace:
     p.add_argument("--symbols", nargs="*", default=["BRL", "EUR", "USD", "JPY"], help="Moedas (ex.: BRL EUR USD JPY)")
     p.add_argument("--days", type=int, default=30, help="Janela de dias até hoje")
     p.add_argument("--overwrite", action="store_true")
-    p.add_argument("--compression", default="snappy", choices=["snappy","gzip","brotli","zstd","none"])
+    p.add_argument("--compression", default="zstd", choices=["snappy","gzip","brotli","zstd","auto","none"])
+    p.add_argument("--downcast", action="store_true",
+                   help="Grava int64/float64 no menor tipo numérico sem perda (Parquet)")
     p.add_argument("--log-level", default="INFO", choices=["DEBUG","INFO","WARNING","ERROR"])
     return p.parse_args()
 
@@ -77,14 +69,36 @@ def _json_default(o):
 
 def _save_quality(quality: dict, name: str) -> Path:
     reports = Path("data/_reports"); reports.mkdir(parents=True, exist_ok=True)
-    out = reports / f"quality_{name}_{pd.Timestamp.now().strftime('%Y%m%d_%H%M%S')}.json"
+    out = reports / f"quality_{name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
     with open(out, "w", encoding="utf-8") as f:
         json.dump(quality, f, ensure_ascii=False, indent=2, default=_json_default)
     logger.info("Quality report salvo: %s", out)
     return out
 
+def _with_year_month(df: pd.DataFrame) -> pd.DataFrame:
+    """Colunas derivadas p/ particionar por mês (date segue como coluna normal).
+    Linhas sem data válida (NaT) não têm partição: são descartadas com aviso."""
+    import pandas as pd
+    dates = pd.to_datetime(df["date"], errors="coerce")
+    invalid = dates.isna()
+    if invalid.any():
+        logger.warning("%s linha(s) sem data válida descartadas do particionamento por mês.",
+                       int(invalid.sum()))
+        df, dates = df[~invalid], dates[~invalid]
+    return df.assign(year=dates.dt.year.astype("int16"), month=dates.dt.month.astype("int8"))
+
 def run_pipeline(args: argparse.Namespace) -> None:
     setup_logging(args.log_level)
+
+    # O .env é carregado uma única vez por src.etl.config, no primeiro get_env()
+    from src.etl.extractor import fetch_countries
+    from src.etl.writer import write_parquet, write_csv
+    from src.etl.transformer import transform_countries
+    from src.etl.exchangerates import fetch_timeseries
+    from src.etl.transformer_rates import transform_rates
+    from src.etl.transformer_enriched import enrich_countries_with_rates
+    from src.etl.gold import build_gold_views
+
     logger.info("Iniciando pipeline: Countries + FX + Gold")
 
     # COUNTRIES (bronze/silver)
@@ -92,38 +106,43 @@ def run_pipeline(args: argparse.Namespace) -> None:
     df_countries_raw = fetch_countries()
     write_parquet(df_countries_raw, args.bronze_countries, "countries_raw",
                   partition_cols=["region"], overwrite=args.overwrite,
-                  compression=None if args.compression=="none" else args.compression)
+                  compression=None if args.compression=="none" else args.compression,
+                  downcast=args.downcast)
 
     logger.info("Transformando Countries → Silver…")
     df_countries_silver, qual_c = transform_countries(df_countries_raw)
     _save_quality(qual_c, "countries")
     write_parquet(df_countries_silver, args.silver_countries, "countries_clean",
                   partition_cols=["region"], overwrite=args.overwrite,
-                  compression=None if args.compression=="none" else args.compression)
+                  compression=None if args.compression=="none" else args.compression,
+                  downcast=args.downcast)
 
     # RATES (bronze/silver)
     end_d = date.today()
     start_d = end_d - timedelta(days=args.days)
     logger.info("Extraindo FX timeseries %s→%s | base=%s | symbols=%s", start_d, end_d, args.base, args.symbols)
     df_rates_raw = fetch_timeseries(args.symbols, start_d, end_d, base=args.base)
-    write_parquet(df_rates_raw, args.bronze_rates, "fx_raw",
-                  partition_cols=["date"], overwrite=args.overwrite,
-                  compression=None if args.compression=="none" else args.compression)
+    write_parquet(_with_year_month(df_rates_raw), args.bronze_rates, "fx_raw",
+                  partition_cols=["year", "month"], overwrite=args.overwrite,
+                  compression=None if args.compression=="none" else args.compression,
+                  downcast=args.downcast)
 
     logger.info("Transformando Rates → Silver…")
     df_rates_silver, qual_r = transform_rates(df_rates_raw)
     _save_quality(qual_r, "rates")
-    write_parquet(df_rates_silver, args.silver_rates, "fx_clean",
-                  partition_cols=["date"], overwrite=args.overwrite,
-                  compression=None if args.compression=="none" else args.compression)
+    write_parquet(_with_year_month(df_rates_silver), args.silver_rates, "fx_clean",
+                  partition_cols=["year", "month"], overwrite=args.overwrite,
+                  compression=None if args.compression=="none" else args.compression,
+                  downcast=args.downcast)
 
     # ENRICHED (silver)
     logger.info("Enriquecendo (join currency_code) → Silver/Enriched…")
     df_enriched, qual_e = enrich_countries_with_rates(df_countries_silver, df_rates_silver)
     _save_quality(qual_e, "enriched")
-    write_parquet(df_enriched, args.silver_enriched, "countries_fx",
-                  partition_cols=["date"], overwrite=args.overwrite,
-                  compression=None if args.compression=="none" else args.compression)
+    write_parquet(_with_year_month(df_enriched), args.silver_enriched, "countries_fx",
+                  partition_cols=["year", "month"], overwrite=args.overwrite,
+                  compression=None if args.compression=="none" else args.compression,
+                  downcast=args.downcast)
 
     # GOLD (CSVs prontos para visual)
     logger.info("Gerando camada Gold (CSVs para visual)…")
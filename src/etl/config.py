@@ -5,28 +5,55 @@ import os
 from pathlib import Path
 from typing import Optional
 
-from dotenv import load_dotenv
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 
 # Carrega .env da raiz do projeto (ajuste se sua estrutura for diferente)
 # Procura um .env na raiz do repo (acima de src/)
 PROJECT_ROOT = Path(__file__).resolve().parents[2]  # .../projeto/ src/ etl/ config.py
 ENV_FILE = PROJECT_ROOT / ".env"
 
-# load_dotenv não dá erro se o arquivo não existir
-load_dotenv(dotenv_path=ENV_FILE, override=False)
+_DOTENV_LOADED = False
+
+
+def _load_env_once() -> None:
+    """Importa python-dotenv e carrega o .env só no primeiro acesso a uma variável."""
+    global _DOTENV_LOADED
+    if _DOTENV_LOADED:
+        return
+    from dotenv import load_dotenv
+    # load_dotenv não dá erro se o arquivo não existir
+    load_dotenv(dotenv_path=ENV_FILE, override=False)
+    _DOTENV_LOADED = True
 
 
 def get_env(name: str, default: Optional[str] = None) -> Optional[str]:
     """Leitura centralizada de variáveis de ambiente."""
+    _load_env_once()
     return os.getenv(name, default)
 
+
+def _env(name: str, default: str):
+    return field(default_factory=lambda: get_env(name, default))
+
+
+def _env_int(name: str, default: str):
+    return field(default_factory=lambda: int(get_env(name, default)))
+
+
 @dataclass(frozen=True)
 class Settings:
-    bronze_dir: str = os.getenv("BRONZE_DIR", "data/bronze/countries")
-    silver_dir: str = os.getenv("SILVER_DIR", "data/silver/countries")
-    rest_countries_url: str = os.getenv("REST_COUNTRIES_URL", "https://restcountries.com/v3.1/all")
-    http_timeout: int = int(os.getenv("HTTP_TIMEOUT", "30"))
-    http_max_retries: int = int(os.getenv("HTTP_MAX_RETRIES", "3"))
-
-settings = Settings()
\ No newline at end of file
+    bronze_dir: str = _env("BRONZE_DIR", "data/bronze/countries")
+    silver_dir: str = _env("SILVER_DIR", "data/silver/countries")
+    rest_countries_url: str = _env("REST_COUNTRIES_URL", "https://restcountries.com/v3.1/all")
+    http_timeout: int = _env_int("HTTP_TIMEOUT", "30")
+    http_max_retries: int = _env_int("HTTP_MAX_RETRIES", "3")
+    # Limite de moedas por requisição de timeseries (varia por provedor/plano)
+    max_symbol_batch: int = _env_int("MAX_SYMBOL_BATCH", "20")
+
+
+def __getattr__(name: str):
+    # `settings` é criado no primeiro acesso (PEP 562), já com o .env carregado
+    if name == "settings":
+        globals()["settings"] = Settings()
+        return globals()["settings"]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
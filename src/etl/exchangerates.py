@@ -1,55 +1,96 @@
 # src/etl/exchangerates.py (robust fallback)
 from __future__ import annotations
 
-import os
+import atexit
 import logging
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from datetime import date
-from typing import Iterable, Dict, Any, List
+from functools import lru_cache
+from typing import Callable, Iterable, Dict, Any
 
 import httpx
+import numpy as np
+import orjson
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
 from tenacity import retry, wait_exponential, stop_after_attempt, RetryError
 
+from .config import get_env
+
 logger = logging.getLogger("etl.exchangerates")
 
+# Cliente único (keep-alive + HTTP/2): retries e chamadas seguidas reaproveitam a conexão
+_CLIENT = httpx.Client(
+    timeout=30,
+    http2=True,
+    headers={"User-Agent": "projeto_api_etl_compass/1.0"},
+    limits=httpx.Limits(max_keepalive_connections=10),
+)
+atexit.register(_CLIENT.close)
+
 def _as_iso(d: date | str) -> str:
     if isinstance(d, date):
         return d.isoformat()
-    return pd.to_datetime(d).date().isoformat()
+    return _iso_from_str(str(d))
+
+@lru_cache(maxsize=128)
+def _iso_from_str(s: str) -> str:
+    return pd.to_datetime(s).date().isoformat()
 
+@lru_cache(maxsize=1)
 def _settings():
-    provider = os.getenv("EXCHANGE_PROVIDER", "").strip().lower()
-    api_key = os.getenv("EXCHANGERATE_API_KEY", "").strip()
-    timeout = int(os.getenv("HTTP_TIMEOUT", "30"))
-    return provider, api_key, timeout
+    """Lido uma vez por processo (get_env carrega o .env no primeiro acesso)."""
+    provider = (get_env("EXCHANGE_PROVIDER", "") or "").strip().lower()
+    api_key = (get_env("EXCHANGERATE_API_KEY", "") or "").strip()
+    timeout = int(get_env("HTTP_TIMEOUT", "30"))
+    # Segundos até disparar o hedge na Frankfurter; negativo desliga
+    hedge_after_s = float(get_env("FX_HEDGE_AFTER_S", "5") or -1)
+    return provider, api_key, timeout, hedge_after_s
 
 @retry(wait=wait_exponential(multiplier=1, min=1, max=8), stop=stop_after_attempt(5))
 def _get_json(url: str, params: Dict[str, Any] | None = None,
               headers: Dict[str, str] | None = None, timeout: int = 30) -> Dict[str, Any]:
-    with httpx.Client(timeout=timeout, headers=headers or {"User-Agent": "projeto_api_etl_compass/1.0"}) as client:
-        r = client.get(url, params=params)
-        r.raise_for_status()
-        return r.json()
-
-def _normalize_timeseries_payload(data: Dict[str, Any], base_fallback: str) -> pd.DataFrame:
+    r = _CLIENT.get(url, params=params, headers=headers, timeout=timeout)
+    r.raise_for_status()
+    return orjson.loads(r.content)
+
+def _normalize_timeseries_payload(data: Dict[str, Any], base_fallback: str,
+                                  sort: bool = False) -> pd.DataFrame:
+    """
+    Achata {date: {moeda: valor}} em formato longo (ordem: date, depois moeda do payload).
+    Ordenação global é opcional: transform_rates já ordena por (date, currency_code).
+    """
     rates = data.get("rates")
     if not isinstance(rates, dict) or not rates:
         raise RuntimeError(f"Resposta sem 'rates' válida. Amostra: {str(data)[:300]}")
 
-    rows: List[Dict[str, Any]] = []
-    for d_str, cur_map in rates.items():
-        for cur, val in (cur_map or {}).items():
-            rows.append({"date": d_str, "currency_code": cur, "rate_to_base": val, "base": data.get("base", base_fallback)})
-
-    df = pd.DataFrame(rows)
-    if df.empty:
+    # Pivot único em C: {date: {moeda: valor}} → (date, currency_code, rate_to_base)
+    wide = pd.DataFrame.from_dict({d: m for d, m in rates.items() if m}, orient="index")
+    long = wide.stack(future_stack=True).dropna()
+    if long.empty:
         raise RuntimeError("Timeseries retornou vazio após normalização.")
 
-    df["date"] = pd.to_datetime(df["date"], errors="coerce")
-    df["currency_code"] = df["currency_code"].astype("string")
-    df["rate_to_base"] = pd.to_numeric(df["rate_to_base"], errors="coerce").astype("float64")
-    df["base"] = df["base"].astype("string")
-    return df.sort_values(["currency_code", "date"]).reset_index(drop=True)
+    # Colunas montadas direto em Arrow e convertidas para pandas uma única vez
+    # (datetime64[ns], category, float32, category — os mesmos dtypes esperados downstream)
+    n = len(long)
+    dates = pa.array(long.index.get_level_values(0).astype(str), pa.string()).dictionary_encode()
+    codes = pa.array(long.index.get_level_values(1).astype(str), pa.string()).dictionary_encode()
+    values = pd.to_numeric(long.to_numpy(), errors="coerce")
+    base = str(data.get("base", base_fallback))
+    table = pa.table({
+        # Provedores devolvem só ISO YYYY-MM-DD: parse só das datas únicas (dicionário) e take
+        "date": pc.strptime(dates.dictionary, format="%Y-%m-%d", unit="ns", error_is_null=True)
+                  .take(dates.indices),
+        "currency_code": codes,
+        # FX tem 4–6 dígitos significativos: float32 basta
+        "rate_to_base": pa.array(values, pa.float32()),
+        "base": pa.DictionaryArray.from_arrays(pa.array(np.zeros(n, dtype="int8")), pa.array([base])),
+    })
+    df = table.to_pandas()
+    if sort:
+        df = df.sort_values(["currency_code", "date"], ignore_index=True)
+    return df
 
 def _fetch_timeseries_apilayer(symbols: list[str], start_date: str, end_date: str,
                                base: str, timeout: int, api_key: str) -> pd.DataFrame:
@@ -72,9 +113,78 @@ def _fetch_timeseries_frankfurter(symbols: list[str], start_date: str, end_date:
     data = _get_json(url, params=params, timeout=timeout)
     return _normalize_timeseries_payload(data, base_fallback=base)
 
+def _fetch_apilayer_chain(sym: list[str], start_iso: str, end_iso: str,
+                          base: str, timeout: int, api_key: str) -> pd.DataFrame:
+    """APILayer com os tratamentos/fallbacks de erro (401/403, base restrita, payload inválido)."""
+    try:
+        return _fetch_timeseries_apilayer(sym, start_iso, end_iso, base, timeout, api_key)
+    except RetryError as re:
+        # Pode envolver HTTPStatusError 401/403; fazemos fallback direto
+        logger.warning("APILayer RetryError: %s. Fallback para Frankfurter (base=EUR).", re)
+        return _fetch_timeseries_frankfurter(sym, start_iso, end_iso, "EUR", timeout)
+    except httpx.HTTPStatusError as he:
+        code = he.response.status_code if he.response is not None else None
+        if code in (401, 403):
+            logger.warning("APILayer %s Unauthorized/Forbidden. Fallback para Frankfurter (base=EUR).", code)
+            return _fetch_timeseries_frankfurter(sym, start_iso, end_iso, "EUR", timeout)
+        # Se base for restrita pelo plano, tente EUR na APILayer primeiro
+        msg = str(he).lower()
+        if "base" in msg and ("restrict" in msg or "105" in msg):
+            logger.warning("Restrição de base detectada. Tentando APILayer com base=EUR.")
+            try:
+                return _fetch_timeseries_apilayer(sym, start_iso, end_iso, "EUR", timeout, api_key)
+            except Exception as e2:
+                logger.warning("APILayer com base=EUR falhou (%s). Fallback para Frankfurter (base=EUR).", e2)
+                return _fetch_timeseries_frankfurter(sym, start_iso, end_iso, "EUR", timeout)
+        raise
+    except RuntimeError as rte:
+        msg = str(rte).lower()
+        if "base" in msg and ("restrict" in msg or "105" in msg):
+            logger.warning("Restrição de base detectada. Tentando APILayer com base=EUR.")
+            try:
+                return _fetch_timeseries_apilayer(sym, start_iso, end_iso, "EUR", timeout, api_key)
+            except Exception as e2:
+                logger.warning("APILayer com base=EUR falhou (%s). Fallback para Frankfurter (base=EUR).", e2)
+                return _fetch_timeseries_frankfurter(sym, start_iso, end_iso, "EUR", timeout)
+        logger.warning("APILayer falhou (%s). Fallback para Frankfurter (base=%s).", rte, base)
+        return _fetch_timeseries_frankfurter(sym, start_iso, end_iso, base, timeout)
+
+def _hedged(primary: Callable[[], pd.DataFrame], hedge: Callable[[], pd.DataFrame],
+            hedge_after_s: float) -> pd.DataFrame:
+    """
+    Hedged request: se `primary` não responder em `hedge_after_s`, dispara `hedge` em paralelo
+    e devolve o primeiro resultado sem erro. A chamada perdedora é abandonada (threads não são
+    canceláveis); o executor é encerrado sem esperar por ela.
+    """
+    if hedge_after_s < 0:
+        return primary()
+
+    ex = ThreadPoolExecutor(max_workers=2, thread_name_prefix="fx-hedge")
+    try:
+        primary_f = ex.submit(primary)
+        futures = {primary_f}
+        done, _ = wait(futures, timeout=hedge_after_s)
+        if not done:
+            logger.warning("APILayer sem resposta em %.1fs. Disparando Frankfurter em paralelo (hedge).",
+                           hedge_after_s)
+            futures.add(ex.submit(hedge))
+
+        pending = futures
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for f in done:
+                if f.exception() is None:
+                    return f.result()
+                if f is not primary_f:
+                    logger.warning("Hedge (Frankfurter) falhou: %s", f.exception())
+        # Ambos falharam: o erro do primário é a causa real (o hedge costuma falhar antes)
+        raise primary_f.exception()
+    finally:
+        ex.shutdown(wait=False, cancel_futures=True)
+
 def fetch_timeseries(symbols: Iterable[str], start_date: date | str, end_date: date | str,
                      base: str = "USD", timeout: int | None = None) -> pd.DataFrame:
-    provider, api_key, env_timeout = _settings()
+    provider, api_key, env_timeout, hedge_after_s = _settings()
     timeout = timeout or env_timeout
 
     sym = [s.strip().upper() for s in symbols if s and str(s).strip()]
@@ -90,38 +200,11 @@ def fetch_timeseries(symbols: Iterable[str], start_date: date | str, end_date: d
             logger.warning("EXCHANGERATE_API_KEY ausente/inválida. Fallback para Frankfurter (base=EUR).")
             return _fetch_timeseries_frankfurter(sym, start_iso, end_iso, "EUR", timeout)
 
-        try:
-            return _fetch_timeseries_apilayer(sym, start_iso, end_iso, base, timeout, api_key)
-        except RetryError as re:
-            # Pode envolver HTTPStatusError 401/403; fazemos fallback direto
-            logger.warning("APILayer RetryError: %s. Fallback para Frankfurter (base=EUR).", re)
-            return _fetch_timeseries_frankfurter(sym, start_iso, end_iso, "EUR", timeout)
-        except httpx.HTTPStatusError as he:
-            code = he.response.status_code if he.response is not None else None
-            if code in (401, 403):
-                logger.warning("APILayer %s Unauthorized/Forbidden. Fallback para Frankfurter (base=EUR).", code)
-                return _fetch_timeseries_frankfurter(sym, start_iso, end_iso, "EUR", timeout)
-            # Se base for restrita pelo plano, tente EUR na APILayer primeiro
-            msg = str(he).lower()
-            if "base" in msg and ("restrict" in msg or "105" in msg):
-                logger.warning("Restrição de base detectada. Tentando APILayer com base=EUR.")
-                try:
-                    return _fetch_timeseries_apilayer(sym, start_iso, end_iso, "EUR", timeout, api_key)
-                except Exception as e2:
-                    logger.warning("APILayer com base=EUR falhou (%s). Fallback para Frankfurter (base=EUR).", e2)
-                    return _fetch_timeseries_frankfurter(sym, start_iso, end_iso, "EUR", timeout)
-            raise
-        except RuntimeError as rte:
-            msg = str(rte).lower()
-            if "base" in msg and ("restrict" in msg or "105" in msg):
-                logger.warning("Restrição de base detectada. Tentando APILayer com base=EUR.")
-                try:
-                    return _fetch_timeseries_apilayer(sym, start_iso, end_iso, "EUR", timeout, api_key)
-                except Exception as e2:
-                    logger.warning("APILayer com base=EUR falhou (%s). Fallback para Frankfurter (base=EUR).", e2)
-                    return _fetch_timeseries_frankfurter(sym, start_iso, end_iso, "EUR", timeout)
-            logger.warning("APILayer falhou (%s). Fallback para Frankfurter (base=%s).", rte, base)
-            return _fetch_timeseries_frankfurter(sym, start_iso, end_iso, base, timeout)
+        return _hedged(
+            lambda: _fetch_apilayer_chain(sym, start_iso, end_iso, base, timeout, api_key),
+            lambda: _fetch_timeseries_frankfurter(sym, start_iso, end_iso, base, timeout),
+            hedge_after_s,
+        )
 
     # Provider padrão/grátis
     logger.info("Provider: Frankfurter (free, sem chave)")
@@ -1,75 +1,255 @@
 # src/etl/extractors.py
 from __future__ import annotations
 
+import asyncio
+import atexit
+import logging
+import math
+import random
+import time
 from datetime import date, timedelta
-from typing import Iterable, List
+from pathlib import Path
+from typing import List
 import httpx
+import numpy as np
+import orjson
 import pandas as pd
 
+try:  # opcional: pysimdjson para payloads de timeseries grandes (SIMDJSON_ENABLED=1)
+    import simdjson
+except ImportError:
+    simdjson = None
+
 # importa e já carrega o .env
-from .config import get_env  # noqa: F401
+from .config import get_env, settings  # noqa: F401
+
+logger = logging.getLogger("etl.extractor")
 
 # ---------------- Endpoints
 REST_COUNTRIES_URL = "https://restcountries.com/v3.1/all"
 EXCHANGERATE_TS_URL = "https://api.exchangerate.host/timeframe"  # endpoint atual
 
+# Concorrência/retry dos lotes de timeseries
+MAX_CONCURRENT_REQUESTS = 8
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+# Cliente síncrono persistente (keep-alive + HTTP/2) para as chamadas fora do loop async
+_CLIENT = httpx.Client(
+    http2=True,
+    timeout=httpx.Timeout(60.0, connect=10.0),
+    limits=httpx.Limits(max_connections=16, max_keepalive_connections=16),
+)
+atexit.register(_CLIENT.close)
+
+RAW_COUNTRY_FIELDS = ["name", "cca2", "cca3", "currencies", "region", "subregion", "population", "latlng"]
+
+# ---------------- Cache local (parquet por dia + resposta bruta p/ requisição condicional)
+CACHE_DIR = Path("data/_cache")
+COUNTRIES_RAW_CACHE = CACHE_DIR / "countries.json"
+COUNTRIES_RAW_META = CACHE_DIR / "countries.meta.json"
+
 
 # ============== REST Countries ==============
-def fetch_countries() -> pd.DataFrame:
+def _cache_ttl_hours() -> float:
+    """TTL do cache de países (CONFIG_CACHE_TTL_HOURS); 0 desliga o cache."""
+    try:
+        return float(get_env("CONFIG_CACHE_TTL_HOURS", "24") or 0)
+    except ValueError:
+        return 0.0
+
+
+def _read_countries_cache(ttl_hours: float) -> pd.DataFrame | None:
+    """Lê o cache mais recente ainda dentro do TTL; None se não houver."""
+    if ttl_hours <= 0 or not CACHE_DIR.exists():
+        return None
+    candidates = sorted(CACHE_DIR.glob("countries_*.parquet"))
+    if not candidates:
+        return None
+    path = candidates[-1]
+    age_h = (time.time() - path.stat().st_mtime) / 3600
+    if age_h > ttl_hours:
+        return None
+
+    df = pd.read_parquet(path)
+    # 'currencies' vai como JSON; volta para a forma compacta ((code, name, symbol), ...)
+    df["currencies"] = df["currencies"].map(
+        lambda b: tuple(map(tuple, orjson.loads(b))) if isinstance(b, str) else ()
+    )
+    logger.info("REST Countries via cache: %s (%.1fh)", path, age_h)
+    return df
+
+
+def _write_countries_cache(df: pd.DataFrame) -> Path:
+    path = CACHE_DIR / f"countries_{date.today():%Y%m%d}.parquet"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    out = df.assign(currencies=df["currencies"].map(lambda t: orjson.dumps(t).decode()))
+    out.to_parquet(path, index=False, compression="zstd", engine="pyarrow")
+    return path
+
+
+def _download_countries(use_cache: bool) -> bytes:
+    """Baixa o JSON bruto da REST Countries.
+    Com use_cache, envia If-None-Match/If-Modified-Since da última resposta salva;
+    em 304 reaproveita o corpo do disco (sem transferir o payload de novo).
+    """
+    params = {"fields": ",".join(RAW_COUNTRY_FIELDS)}
+    headers = {}
+    meta = {}
+    if use_cache and COUNTRIES_RAW_CACHE.exists() and COUNTRIES_RAW_META.exists():
+        try:
+            meta = orjson.loads(COUNTRIES_RAW_META.read_bytes())
+        except (OSError, orjson.JSONDecodeError):
+            meta = {}
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+
+    resp = _CLIENT.get(REST_COUNTRIES_URL, params=params, headers=headers, timeout=30)
+    if resp.status_code == 304 and headers:
+        logger.info("REST Countries: 304 Not Modified, usando %s", COUNTRIES_RAW_CACHE)
+        return COUNTRIES_RAW_CACHE.read_bytes()
+    resp.raise_for_status()
+
+    validators = {"etag": resp.headers.get("ETag"), "last_modified": resp.headers.get("Last-Modified")}
+    if use_cache and any(validators.values()):
+        CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        COUNTRIES_RAW_CACHE.write_bytes(resp.content)
+        COUNTRIES_RAW_META.write_bytes(orjson.dumps(validators))
+    return resp.content
+
+
+def _currencies_tuple(currencies: dict | float | None) -> tuple:
+    """{"EUR": {"name": ..., "symbol": ...}} → (("EUR", name, symbol), ...); () se ausente."""
+    if not isinstance(currencies, dict):
+        return ()
+    return tuple((k, (v or {}).get("name"), (v or {}).get("symbol")) for k, v in currencies.items())
+
+
+def fetch_countries(use_cache: bool = True) -> pd.DataFrame:
     """
     Busca lista de países da API REST Countries e retorna como DataFrame.
     Campos principais: nome, siglas, região, sub-região, moedas.
+    Com use_cache, reaproveita data/_cache/countries_YYYYMMDD.parquet dentro do TTL;
+    fora do TTL, revalida a resposta salva via ETag/Last-Modified.
+    CONFIG_CACHE_TTL_HOURS=0 desliga os dois caches (parquet diário e resposta/ETag).
     """
-    params = {
-        "fields": "name,cca2,cca3,currencies,region,subregion,population,latlng"
-    }
-    resp = httpx.get(REST_COUNTRIES_URL, params=params, timeout=30)
-    resp.raise_for_status()
-    data = resp.json()
-
-    rows = []
-    for c in data:
-        rows.append({
-            "country_name": c.get("name", {}).get("common"),
-            "cca2": c.get("cca2"),
-            "cca3": c.get("cca3"),
-            "region": c.get("region"),
-            "subregion": c.get("subregion"),
-            "population": c.get("population"),
-            "lat": (c.get("latlng") or [None, None])[0],
-            "lng": (c.get("latlng") or [None, None])[1],
-            "currencies": c.get("currencies"),
-        })
-    return pd.DataFrame(rows)
+    ttl_hours = _cache_ttl_hours() if use_cache else 0.0
+    cached = _read_countries_cache(ttl_hours)
+    if cached is not None:
+        return cached
+
+    data = orjson.loads(_download_countries(use_cache and ttl_hours > 0))
+
+    # Projeção colunar única (sem loop por país). Não usamos json_normalize com
+    # max_level>=1 porque ele achataria 'currencies' em uma coluna por moeda.
+    raw = pd.DataFrame.from_records(data).reindex(columns=RAW_COUNTRY_FIELDS)
+    df = pd.DataFrame({
+        "country_name": raw["name"].str.get("common"),
+        "cca2": raw["cca2"],
+        "cca3": raw["cca3"],
+        "region": raw["region"].astype("category"),        # baixa cardinalidade
+        "subregion": raw["subregion"].astype("category"),
+        "population": raw["population"],
+        "lat": raw["latlng"].str.get(0),
+        "lng": raw["latlng"].str.get(1),
+        # Forma compacta ((code, name, symbol), ...) na ordem da API: convertida uma vez aqui,
+        # os passos seguintes só iteram tuplas (moeda principal = .str[0].str[0])
+        "currencies": raw["currencies"].map(_currencies_tuple),
+    })
+
+    if ttl_hours > 0:
+        _write_countries_cache(df)
+    return df
 
 
 def explode_currencies(df_countries: pd.DataFrame) -> pd.DataFrame:
     """
-    Transforma a coluna 'currencies' (dict) em múltiplas linhas.
+    Transforma a coluna 'currencies' ((code, name, symbol), ...) em múltiplas linhas.
     Cada país aparece uma vez por moeda.
+    Vetorizado: explode das tuplas → split em colunas.
     """
-    records = []
-    for _, row in df_countries.iterrows():
-        currencies = row.get("currencies") or {}
-        for code, meta in currencies.items():
-            meta = meta or {}
-            records.append({
-                "cca2": row.get("cca2"),
-                "cca3": row.get("cca3"),
-                "country_name": row.get("country_name"),
-                "region": row.get("region"),
-                "subregion": row.get("subregion"),
-                "currency_code": code,
-                "currency_name": meta.get("name"),
-                "currency_symbol": meta.get("symbol"),
-            })
-    return pd.DataFrame(records)
+    cols = ["cca2", "cca3", "country_name", "region", "subregion"]
+    out_cols = cols + ["currency_code", "currency_name", "currency_symbol"]
+    if df_countries is None or df_countries.empty:
+        return pd.DataFrame(columns=out_cols)
+
+    df = df_countries[cols + ["currencies"]].rename(columns={"currencies": "_pairs"})
+    df = df.explode("_pairs", ignore_index=True)
+    df = df[df["_pairs"].notna()].reset_index(drop=True)
+
+    triples = pd.DataFrame(df.pop("_pairs").tolist(), index=df.index,
+                           columns=["currency_code", "currency_name", "currency_symbol"])
+    df = pd.concat([df, triples], axis=1)
+    return df.dropna(subset=["currency_code"]).reset_index(drop=True)[out_cols]
 
 
 # ============== exchangerate.host ==============
-def _chunk(lst: List[str], n: int) -> Iterable[List[str]]:
-    for i in range(0, len(lst), n):
-        yield lst[i:i + n]
+def _chunk(lst: List[str], n: int) -> List[np.ndarray]:
+    """Divide em ceil(len/n) lotes equilibrados (nenhum maior que n)."""
+    if not lst:
+        return []
+    return np.array_split(np.asarray(lst), math.ceil(len(lst) / n))
+
+
+def _rates_to_long(table: dict, prefix: str | None = None) -> pd.DataFrame:
+    """
+    {date: {code: val}} → (date, currency_code, rate_to_usd) num único pivot vetorizado.
+    Com `prefix` (ex.: "USD" em "USDEUR"), mantém só os pares da fonte e remove o prefixo.
+    """
+    wide = pd.DataFrame.from_dict({d: m for d, m in table.items() if m}, orient="index")
+    if wide.empty:
+        return pd.DataFrame(columns=["date", "currency_code", "rate_to_usd"])
+
+    cols = wide.columns.astype(str).str.upper()
+    if prefix:
+        keep = cols.str.startswith(prefix)
+        wide, cols = wide.loc[:, keep], cols[keep].str.removeprefix(prefix)
+    wide.columns = cols
+
+    long = wide.stack(future_stack=True).rename("rate_to_usd").reset_index()
+    long.columns = ["date", "currency_code", "rate_to_usd"]
+    long["rate_to_usd"] = pd.to_numeric(long["rate_to_usd"], errors="coerce")
+    return long.dropna(subset=["rate_to_usd"]).reset_index(drop=True)
+
+
+def _loads_timeseries(content: bytes) -> dict:
+    if simdjson is not None and get_env("SIMDJSON_ENABLED", "0") == "1":
+        return simdjson.Parser().parse(content).as_dict()
+    return orjson.loads(content)
+
+
+async def _fetch_one(client: httpx.AsyncClient, params: dict, sem: asyncio.Semaphore,
+                     retries: int, backoff_s: float) -> dict:
+    # Semáforo limita requisições simultâneas; 429/5xx/erros de rede têm backoff exponencial + jitter
+    async with sem:
+        attempt = 0
+        while True:
+            try:
+                resp = await client.get(EXCHANGERATE_TS_URL, params=params)
+                resp.raise_for_status()
+                break
+            except (httpx.TransportError, httpx.HTTPStatusError) as e:
+                retryable = (isinstance(e, httpx.TransportError)
+                             or e.response.status_code in RETRY_STATUS)
+                if not retryable or attempt >= retries:
+                    raise
+                await asyncio.sleep(random.uniform(0, backoff_s * 2 ** attempt))  # full jitter
+                attempt += 1
+    # Decodificação fora do event loop: os demais lotes seguem recebendo bytes enquanto isso
+    data = await asyncio.to_thread(_loads_timeseries, resp.content)
+
+    # Alguns erros vêm como success:false
+    if isinstance(data, dict) and data.get("success") is False:
+        raise RuntimeError(f"exchangerate.host retornou erro: {data.get('error')}")
+    return data
+
+
+async def _fetch_batches(params_list: list[dict], timeout_s: int,
+                         retries: int = 3, backoff_s: float = 0.5) -> list[dict]:
+    sem = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+    async with httpx.AsyncClient(timeout=timeout_s, http2=True) as client:
+        return await asyncio.gather(*[_fetch_one(client, p, sem, retries, backoff_s) for p in params_list])
 
 
 def fetch_timeseries(
@@ -78,15 +258,19 @@ def fetch_timeseries(
     end_d: date,
     base: str = "USD",          # mantido por compatibilidade; fonte costuma ser USD no plano gratuito
     api_key: str | None = None, # pode ser passado manualmente; por padrão vem do .env
-    max_batch: int = 20,
+    max_batch: int | None = None,  # padrão: settings.max_symbol_batch (env MAX_SYMBOL_BATCH)
     timeout_s: int = 60,
 ) -> pd.DataFrame:
     """
-    Busca série histórica de câmbio em lotes (até 20 moedas por vez) usando /timeframe.
+    Busca série histórica de câmbio em lotes (até max_batch moedas por vez) usando /timeframe.
+    Os lotes são requisitados concorrentemente (httpx.AsyncClient + asyncio.gather).
     Retorna colunas: date (str), currency_code, rate_to_usd (float).
     """
     # saneamento de entrada
-    symbols = sorted(set([s.upper() for s in symbols if isinstance(s, str) and len(s) == 3]))
+    # upper + unique (ordenado) em uma passada numpy; só códigos de exatamente 3 letras
+    # (filtrar antes do dtype "U3": ele truncaria "EURO" para "EUR" em vez de descartar)
+    codes = np.asarray([s for s in symbols if isinstance(s, str) and len(s) == 3], dtype="U3")
+    symbols = np.unique(np.char.upper(codes)).tolist()
     if not symbols or start_d > end_d:
         return pd.DataFrame(columns=["date", "currency_code", "rate_to_usd"])
     if (end_d - start_d).days > 365:
@@ -95,56 +279,48 @@ def fetch_timeseries(
     # usa access_key na query (modelo exchangerate.host)
     api_key = api_key or get_env("EXCHANGERATE_API_KEY") or None
 
-    frames: list[pd.DataFrame] = []
+    max_batch = max_batch or settings.max_symbol_batch
+    params_list = []
     for batch in _chunk(symbols, max_batch):
         params = {
             "start_date": start_d.isoformat(),
             "end_date": end_d.isoformat(),
-            "currencies": ",".join(batch),   # nome do parâmetro na /timeframe
+            "currencies": ",".join(batch.tolist()),   # nome do parâmetro na /timeframe
         }
         if api_key:
             params["access_key"] = api_key  # auth via query param
+        params_list.append(params)
 
-        resp = httpx.get(EXCHANGERATE_TS_URL, params=params, timeout=timeout_s)
-        resp.raise_for_status()
-        data = resp.json()
-
-        # Alguns erros vêm como success:false
-        if isinstance(data, dict) and data.get("success") is False:
-            raise RuntimeError(f"exchangerate.host retornou erro: {data.get('error')}")
-
-        rows = []
+    # Lotes disparados em paralelo, numa única conexão HTTP/2
+    payloads = asyncio.run(_fetch_batches(params_list, timeout_s, retries=settings.http_max_retries))
 
+    # Junta os lotes no próprio dict {date: {code: val}} (por formato/prefixo) e monta um único DataFrame
+    merged: dict[str | None, dict[str, dict]] = {}
+    for data in payloads:
         # 1) Formato currencylayer-like: { ... "source":"USD", "quotes": { "YYYY-MM-DD": {"USDEUR":0.85, ...}, ... } }
         if isinstance(data, dict) and isinstance(data.get("quotes"), dict):
-            source = (data.get("source") or "USD").upper()
-            for d_str, mapping in data["quotes"].items():
-                for pair, val in (mapping or {}).items():
-                    if isinstance(pair, str) and pair.upper().startswith(source) and val is not None:
-                        code = pair[len(source):].upper()
-                        rows.append({"date": d_str, "currency_code": code, "rate_to_usd": float(val)})
+            prefix, table = (data.get("source") or "USD").upper(), data["quotes"]
 
         # 2) Formato exchangerate.host clássico: { ... "rates": { "YYYY-MM-DD": {"EUR":0.85, ...}, ... } }
         elif isinstance(data, dict) and isinstance(data.get("rates"), dict):
-            for d_str, mapping in data["rates"].items():
-                for code, val in (mapping or {}).items():
-                    if val is not None:
-                        rows.append({"date": d_str, "currency_code": code.upper(), "rate_to_usd": float(val)})
+            prefix, table = None, data["rates"]
 
         else:
             sample = str(data)[:300]
             raise RuntimeError(f"Resposta sem 'quotes' ou 'rates' válida. Amostra: {sample}")
 
-        frames.append(pd.DataFrame(rows))
+        acc = merged.setdefault(prefix, {})
+        for d_str, mapping in table.items():
+            acc.setdefault(d_str, {}).update(mapping or {})
 
-    if not frames:
-        return pd.DataFrame(columns=["date", "currency_code", "rate_to_usd"])
-    return pd.concat(frames, ignore_index=True)
+    frames = [_rates_to_long(table, prefix=prefix) for prefix, table in merged.items()]
+    df = frames[0] if len(frames) == 1 else pd.concat(frames, ignore_index=True)
+    return df.astype({"rate_to_usd": "float32", "currency_code": "category"})
 
 
-# ============== Teste rápido (executa só direto) ==============
-if __name__ == "__main__":
-    # 1) País x moeda
+# ============== Teste rápido (executa só direto, com ETL_SMOKE=1) ==============
+def _smoke() -> None:
+    # 1) País x moeda (usa o cache de data/_cache quando disponível; sem HTTP)
     df_countries = fetch_countries()
     df_map = explode_currencies(df_countries)
     print("País x moeda (amostra):")
@@ -161,3 +337,10 @@ if __name__ == "__main__":
         print("Total linhas:", len(df_rates))
     except Exception as e:
         print("\nFalha ao buscar timeseries:", e)
+
+
+if __name__ == "__main__":
+    if get_env("ETL_SMOKE", "0") == "1":
+        _smoke()
+    else:
+        print("Diagnóstico desligado. Rode com ETL_SMOKE=1 para executar (faz chamadas HTTP).")
@@ -4,6 +4,8 @@ from __future__ import annotations
 from typing import Dict
 import pandas as pd
 
+GOLD_COLS = ["date", "country_name", "region", "subregion", "currency_code", "rate_to_base", "base", "cca3"]
+
 def build_gold_views(df_enriched: pd.DataFrame) -> Dict[str, pd.DataFrame]:
     """Cria DataFrames para a camada Gold.
     - enriched_latest: snapshot do último dia disponível (1 linha por país)
@@ -12,27 +14,30 @@ def build_gold_views(df_enriched: pd.DataFrame) -> Dict[str, pd.DataFrame]:
     if df_enriched is None or df_enriched.empty:
         raise ValueError("df_enriched vazio para camada Gold.")
 
-    df = df_enriched.copy()
-    df["date"] = pd.to_datetime(df["date"], errors="coerce")
-    df = df.dropna(subset=["date", "currency_code", "rate_to_base"]).reset_index(drop=True)
-
-    # 1) Snapshot do último dia (por país)
-    last_day = df["date"].max()
-    latest = (
-        df[df["date"] == last_day]
-        .sort_values(["region", "country_name", "currency_code"])
-        [["date","country_name","region","subregion","currency_code","rate_to_base","base","cca3"]]
+    # Sem .copy() nem round-trip por to_datetime: datetime64 (silver) é usado como está;
+    # texto ISO (YYYY-MM-DD) ordena lexicograficamente e é comparado direto como string
+    dates = df_enriched["date"]
+    is_dt = pd.api.types.is_datetime64_any_dtype(dates)
+    if not is_dt:
+        dates = dates.astype("string")
+    mask = dates.notna() & df_enriched["currency_code"].notna() & df_enriched["rate_to_base"].notna()
+    df = (
+        df_enriched.loc[mask, GOLD_COLS]
+        .assign(date=dates[mask])
+        .sort_values(["date", "region", "country_name", "currency_code"])
         .reset_index(drop=True)
     )
-    latest["date"] = latest["date"].dt.strftime("%Y-%m-%d")
+
+    # 1) Snapshot do último dia (por país): frame já ordenado → fatia a partir do último dia
+    first_latest = df["date"].searchsorted(df["date"].iloc[-1], side="left") if len(df) else 0
+
+    # Datas formatadas uma vez só (texto ISO já está pronto)
+    if is_dt:
+        df["date"] = df["date"].dt.strftime("%Y-%m-%d")
+    latest = df.iloc[first_latest:].reset_index(drop=True)
 
     # 2) Histórico por país (sem agregação)
-    country_ts = (
-        df.sort_values(["date","region","country_name","currency_code"])
-          [["date","country_name","region","subregion","currency_code","rate_to_base","base","cca3"]]
-          .reset_index(drop=True)
-    )
-    country_ts["date"] = country_ts["date"].dt.strftime("%Y-%m-%d")
+    country_ts = df
 
     return {
         "enriched_latest": latest,
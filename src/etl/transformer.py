@@ -2,7 +2,7 @@
 from __future__ import annotations
 
 import logging
-from typing import Dict, Any, Tuple
+from typing import Tuple
 import pandas as pd
 
 logger = logging.getLogger("etl.transformer")
@@ -12,15 +12,7 @@ PRIMARY_COLS = [
     "population", "lat", "lng", "currency_code"
 ]
 
-def _extract_primary_currency(currencies: Dict[str, Any] | float | None) -> str | None:
-    """
-    Extrai o primeiro código de moeda do dicionário 'currencies' da REST Countries.
-    Retorna None se não houver.
-    """
-    if not isinstance(currencies, dict) or not currencies:
-        return None
-    # Pega a primeira chave (ordem não garantida, mas suficiente para nosso bronze/silver)
-    return next(iter(currencies.keys()), None)
+CATEGORY_COLS = ["cca2", "cca3", "region", "subregion", "currency_code"]
 
 def transform_countries(df: pd.DataFrame) -> Tuple[pd.DataFrame, dict]:
     """
@@ -33,11 +25,11 @@ def transform_countries(df: pd.DataFrame) -> Tuple[pd.DataFrame, dict]:
     df = df.copy()
 
     # --- Normalizações básicas ---
-    # Extrai moeda principal
-    df["currency_code"] = df["currencies"].apply(_extract_primary_currency)
-    # Preenche nulos textuais
-    df["region"] = df["region"].fillna("Unknown")
-    df["subregion"] = df["subregion"].fillna("Unknown")
+    # Extrai moeda principal: código da 1ª tupla (code, name, symbol); NaN se não houver
+    df["currency_code"] = df["currencies"].str[0].str[0]
+    # Preenche nulos textuais (bronze pode trazer category; "Unknown" não é categoria)
+    df["region"] = df["region"].astype("string").fillna("Unknown")
+    df["subregion"] = df["subregion"].astype("string").fillna("Unknown")
 
     # Tipagem
     # population pode ter NaN → usar pandas Int64 (nullable)
@@ -45,10 +37,12 @@ def transform_countries(df: pd.DataFrame) -> Tuple[pd.DataFrame, dict]:
     df["lat"] = pd.to_numeric(df["lat"], errors="coerce").astype("float64")
     df["lng"] = pd.to_numeric(df["lng"], errors="coerce").astype("float64")
 
-    # Strings padronizadas
-    for col in ["country_name", "cca2", "cca3", "region", "subregion", "currency_code"]:
+    # Strings padronizadas: country_name (alta cardinalidade) como string;
+    # códigos/regiões como category (joins/groupby comparam códigos inteiros)
+    df["country_name"] = df["country_name"].astype("string")
+    for col in CATEGORY_COLS:
         if col in df.columns:
-            df[col] = df[col].astype("string")
+            df[col] = df[col].astype("category")
 
     # Remove duplicados por cca3 (mantém a primeira ocorrência)
     before = len(df)
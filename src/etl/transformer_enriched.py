@@ -4,6 +4,7 @@ from __future__ import annotations
 import logging
 from typing import Tuple, Dict, Any
 import pandas as pd
+from pandas.api.types import union_categoricals
 
 logger = logging.getLogger("etl.transformer_enriched")
 
@@ -18,36 +19,47 @@ def enrich_countries_with_rates(
 ) -> Tuple[pd.DataFrame, Dict[str, Any]]:
     """
     Faz join simples (left) entre countries (silver) e rates (silver) via currency_code.
+    O resultado não é ordenado; build_gold_views ordena o que expõe.
     """
     if countries_silver is None or countries_silver.empty:
         raise ValueError("countries_silver vazio.")
     if rates_silver is None or rates_silver.empty:
         raise ValueError("rates_silver vazio.")
 
-    c = countries_silver.copy()
-    r = rates_silver.copy()
-
-    # Tipos consistentes
-    c["currency_code"] = c["currency_code"].astype("string")
-    r["currency_code"] = r["currency_code"].astype("string")
-
     cols_c = ["cca3", "country_name", "region", "subregion", "currency_code"]
     cols_r = ["date", "currency_code", "rate_to_base", "base"]
 
-    df = r[cols_r].merge(c[cols_c], on="currency_code", how="left")
+    # Tipos consistentes: mesma category dos dois lados → join compara códigos inteiros.
+    # Categorias em ordem alfabética: sort_values em category ordena pela posição da categoria
+    currency_dtype = pd.CategoricalDtype(union_categoricals(
+        [countries_silver["currency_code"].astype("category"),
+         rates_silver["currency_code"].astype("category")],
+        ignore_order=True,
+        sort_categories=True,
+    ).categories)
+
+    # Só as colunas usadas (sem .copy() dos inputs inteiros); countries indexado pela moeda.
+    # Sem drop_duplicates: várias nações dividem a mesma moeda (EUR, USD…) e todas entram.
+    c_idx = (countries_silver[cols_c]
+             .assign(currency_code=countries_silver["currency_code"].astype(currency_dtype))
+             .set_index("currency_code"))
+    r = rates_silver[cols_r].assign(currency_code=rates_silver["currency_code"].astype(currency_dtype))
+
+    df = r.join(c_idx, on="currency_code", how="left")
 
-    # Ordena/colunas
+    # Colunas (a ordenação fica para a camada Gold, que já ordena suas views)
     for col in PRIMARY_COLS:
         if col not in df.columns:
             df[col] = pd.NA
-    df = df[PRIMARY_COLS].sort_values(["date", "region", "country_name"]).reset_index(drop=True)
+    df = df[PRIMARY_COLS].reset_index(drop=True)
 
+    unmatched = int(df["cca3"].isna().sum())
     quality = {
         "rows": int(len(df)),
         "nulls_per_column": {x: int(df[x].isna().sum()) for x in df.columns},
         "date_min": df["date"].min().strftime("%Y-%m-%d") if len(df) else None,
         "date_max": df["date"].max().strftime("%Y-%m-%d") if len(df) else None,
-        "left_join_unmatched": int(df["cca3"].isna().sum()),
+        "left_join_unmatched": unmatched,
         "sample": df.head(3).to_dict(orient="records"),
     }
     logger.info("Enriched: linhas=%s | não casados pela moeda=%s",
@@ -19,9 +19,12 @@ def transform_rates(df: pd.DataFrame) -> Tuple[pd.DataFrame, Dict[str, Any]]:
     df = df.copy()
     # Tipagem/coerção
     df["date"] = pd.to_datetime(df["date"], errors="coerce")
-    df["currency_code"] = df["currency_code"].astype("string")
-    df["rate_to_base"] = pd.to_numeric(df["rate_to_base"], errors="coerce").astype("float64")
-    df["base"] = df["base"].astype("string")
+    df["rate_to_base"] = pd.to_numeric(df["rate_to_base"], errors="coerce").astype("float32")
+    # category com categorias em ordem alfabética: o bronze chega na ordem de aparição
+    # (dictionary_encode) e sort_values em category ordena pela posição da categoria
+    for col in ("currency_code", "base"):
+        s = df[col].astype("category")
+        df[col] = s.cat.reorder_categories(s.cat.categories.sort_values())
 
     # Remoção de nulos críticos
     df = df.dropna(subset=["date", "currency_code", "rate_to_base"])
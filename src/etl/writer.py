@@ -1,55 +1,517 @@
 # src/etl/writer.py
 from __future__ import annotations
 
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from pathlib import Path
+import atexit
+import codecs
+import hashlib
+import json
 import shutil
 import logging
+import os
+import queue
+import threading
+import uuid
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.fs as pafs
+import pyarrow.parquet as pq
 
 logger = logging.getLogger("etl.writer")
 
+# Ajustes do writer Parquet (pyarrow)
+ZSTD_LEVEL = 3
+ROW_GROUP_SIZE = 128_000
+DATA_PAGE_SIZE = 1 << 20
+DICTIONARY_PAGE_SIZE = 1 << 20
+LEVELED_CODECS = {"zstd", "gzip", "brotli"}
+MANIFEST_NAME = "_MANIFEST.json"  # prefixo "_" → ignorado pelos leitores de dataset do Arrow
+DICT_MAX_RATIO = 0.1  # nunique/linhas abaixo disso → coluna de texto vira dictionary
+MAX_ROWS_PER_FILE = 2_000_000
+WRITE_CHUNK_ROWS = 200_000
+OUTPUT_BUFFER_SIZE = 4 << 20  # buffer dos streams do Arrow: menos pwrite, blocos maiores p/ o kernel
+
+# CSV: fatias codificadas em espera (backpressure) e limite de buffers por writev
+CSV_QUEUE_SIZE = 4
+_IOV_MAX = os.sysconf("SC_IOV_MAX") if hasattr(os, "sysconf") and "SC_IOV_MAX" in os.sysconf_names else 1024
+_CSV_DONE = object()
+
+# Filesystem local do Arrow, único para todas as escritas (arquivos e datasets)
+_FS = pafs.LocalFileSystem()
+
+def _parquet_options(
+    compression: str | None,
+    compression_level: int | None = None,
+    use_dictionary: bool | list[str] = True,
+    data_page_size: int = DATA_PAGE_SIZE,
+    dictionary_page_size: int = DICTIONARY_PAGE_SIZE,
+    schema: pa.Schema | None = None,
+) -> dict:
+    """Opções de escrita do pyarrow: dicionário p/ strings de baixa cardinalidade,
+    estatísticas por row group (pushdown de min/max) e nível de compressão
+    (só para codecs que aceitam nível; sem nível explícito, ZSTD_LEVEL no zstd e o padrão do
+    próprio codec em gzip/brotli). compression="auto" exige o schema (codec por coluna)."""
+    if compression_level is None and compression in {"zstd", "auto"}:
+        compression_level = ZSTD_LEVEL
+    if compression == "auto":
+        codecs_, levels = _auto_codecs(schema, compression_level)
+        opts = _parquet_options(None, None, use_dictionary, data_page_size, dictionary_page_size)
+        opts["compression"] = codecs_
+        if levels:
+            opts["compression_level"] = levels
+        return opts
+    opts = {
+        "compression": compression,
+        "use_dictionary": use_dictionary,
+        "write_statistics": True,
+        "data_page_size": data_page_size,
+        "dictionary_pagesize_limit": dictionary_page_size,
+    }
+    if compression in LEVELED_CODECS and compression_level is not None:
+        opts["compression_level"] = compression_level
+    return opts
+
+@lru_cache(maxsize=64)
+def _schema_for_dtypes(dtypes: tuple) -> pa.Schema:
+    # Frame vazio com os mesmos dtypes: a inferência depende só deles (sem colunas object)
+    empty = pd.DataFrame({name: pd.Series(dtype=dtype) for name, dtype in dtypes})
+    return pa.Schema.from_pandas(empty, preserve_index=False)
+
+def _infer_schema(df: pd.DataFrame) -> pa.Schema:
+    """Schema Arrow do frame; cacheado por (coluna, dtype) entre chamadas.
+    Colunas object dependem do conteúdo (texto, tuplas, só nulos) → inferência completa."""
+    if (df.dtypes == object).any() or not df.columns.map(lambda c: isinstance(c, str)).all():
+        return pa.Schema.from_pandas(df, preserve_index=False)
+    return _schema_for_dtypes(tuple(df.dtypes.items()))
+
+def _auto_codecs(schema: pa.Schema, level: int | None) -> tuple[dict, dict]:
+    """compression="auto": codec por coluna conforme o tipo.
+    Texto/dicionário/aninhado → zstd; numérico/temporal → snappy; booleano → sem compressão.
+    Chaves são os caminhos Parquet das folhas (colunas aninhadas não herdam pelo nome)."""
+    def codec(t: pa.DataType) -> str:
+        if pa.types.is_boolean(t):
+            return "none"
+        if pa.types.is_integer(t) or pa.types.is_floating(t) or pa.types.is_decimal(t) \
+                or pa.types.is_temporal(t):
+            return "snappy"
+        return "zstd"
+
+    # Parquet schema das folhas via um arquivo vazio em memória
+    sink = pa.BufferOutputStream()
+    pq.write_table(schema.empty_table(), sink)
+    pq_schema = pq.read_metadata(pa.BufferReader(sink.getvalue())).schema
+    by_top = {f.name: codec(f.type) for f in schema}
+    codecs_ = {}
+    for i in range(len(pq_schema)):
+        path = pq_schema.column(i).path
+        codecs_[path] = by_top.get(path.split(".", 1)[0], "zstd")
+    levels = {p: level for p, c in codecs_.items() if c in LEVELED_CODECS and level is not None}
+    return codecs_, levels
+
+def _to_arrow(df: pd.DataFrame, schema: pa.Schema | None = None) -> pa.Table:
+    """pandas → Arrow sem índice, com conversão de colunas em paralelo."""
+    return pa.Table.from_pandas(df, schema=schema, preserve_index=False, nthreads=os.cpu_count())
+
+def _auto_dictionary(df: pd.DataFrame, schema: pa.Schema) -> pa.Schema:
+    """Marca como dictionary<int32, string> as colunas de texto com baixa cardinalidade.
+    Só colunas cujo conteúdo é de fato string (object com dict/tupla fica como está)."""
+    n = max(len(df), 1)
+    for col in df.select_dtypes(include=["object", "string"]).columns:
+        if pd.api.types.infer_dtype(df[col], skipna=True) != "string":
+            continue
+        if df[col].nunique(dropna=False) / n < DICT_MAX_RATIO:
+            i = schema.get_field_index(col)
+            schema = schema.set(i, schema.field(i).with_type(pa.dictionary(pa.int32(), pa.string())))
+    return schema
+
+def _has_dictionary(t: pa.DataType) -> bool:
+    return pa.types.is_dictionary(t) or any(_has_dictionary(t.field(i).type)
+                                            for i in range(t.num_fields))
+
+def _hash_array(h, arr: pa.Array) -> None:
+    # buffers Arrow direto no hash (sem serializar); offset/len distinguem fatias
+    h.update(f"{arr.offset}:{len(arr)};".encode())
+    for buf in arr.buffers():
+        if buf is not None:
+            h.update(buf)
+    # buffers() de um DictionaryArray só traz os índices: os valores do dicionário
+    # (inclusive em filhos de struct/list) entram à parte
+    t = arr.type
+    if not _has_dictionary(t):
+        return
+    if pa.types.is_dictionary(t):
+        _hash_array(h, arr.dictionary)
+    elif pa.types.is_struct(t):
+        for i in range(t.num_fields):
+            _hash_array(h, arr.field(i))
+    else:  # list/large_list/fixed_size_list/map
+        _hash_array(h, arr.values)
+
+def _content_hash(data: pd.DataFrame | pa.Table) -> str:
+    h = hashlib.blake2b(digest_size=16)
+    if isinstance(data, pa.Table):
+        for col in data.columns:
+            for chunk in col.chunks:
+                _hash_array(h, chunk)
+    else:
+        h.update(pd.util.hash_pandas_object(data, index=False).to_numpy().tobytes())
+    return h.hexdigest()
+
+def _fingerprint(df: pd.DataFrame | pa.Table, schema: pa.Schema, params: dict) -> dict:
+    """Impressão digital barata do conteúdo (hash por linha no pandas, buffers no Arrow)
+    → blake2b, + schema e parâmetros."""
+    return {
+        "fp": _content_hash(df),
+        "rows": int(len(df)),
+        "schema": schema.remove_metadata().to_string(),
+        "params": params,
+    }
+
+def _read_manifest(out_dir: Path) -> dict | None:
+    try:
+        return json.loads((out_dir / MANIFEST_NAME).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+
+def _downcast(df: pd.DataFrame, schema: pa.Schema) -> pa.Schema:
+    """Reduz no schema Arrow int64 → menor inteiro que comporta [min, max] e
+    float64 → float32 quando o round-trip é exato (sem perda). O cast é feito
+    pelo Arrow na conversão (seguro: estoura erro se algo não couber)."""
+    for col in df.columns:
+        s = df[col]
+        if pd.api.types.is_bool_dtype(s) or not pd.api.types.is_numeric_dtype(s):
+            continue
+        i = schema.get_field_index(str(col))
+        if pd.api.types.is_integer_dtype(s) and s.dtype.itemsize == 8:
+            lo, hi = s.min(), s.max()
+            if pd.isna(lo):
+                continue
+            for np_t, pa_t in ((np.int8, pa.int8()), (np.int16, pa.int16()), (np.int32, pa.int32())):
+                if np.iinfo(np_t).min <= lo and hi <= np.iinfo(np_t).max:
+                    schema = schema.set(i, schema.field(i).with_type(pa_t))
+                    break
+        elif s.dtype == np.float64:
+            v = s.to_numpy()
+            if np.array_equal(v.astype(np.float32).astype(np.float64), v, equal_nan=True):
+                schema = schema.set(i, schema.field(i).with_type(pa.float32()))
+    return schema
+
+def _drop_null_columns(df: pd.DataFrame, schema: pa.Schema, keep: list[str]) -> pa.Schema:
+    """Tira do schema as colunas 100% nulas (não geram páginas/dicionário/estatísticas)
+    e registra os nomes no metadata 'null_columns' para o leitor poder recriá-las."""
+    if df.empty:
+        return schema
+    null_cols = [str(c) for c in df.columns if c not in keep and df[c].isna().all()]
+    if not null_cols:
+        return schema
+    logger.info("Colunas 100%% nulas omitidas do Parquet: %s", null_cols)
+    fields = [f for f in schema if f.name not in null_cols]
+    return pa.schema(fields, metadata={**(schema.metadata or {}),
+                                       b"null_columns": json.dumps(null_cols).encode()})
+
 def write_parquet(
-    df: pd.DataFrame,
+    df: pd.DataFrame | pa.Table | pa.RecordBatchReader,
     output_dir: str | Path,
     file_stem: str = "data",
     partition_cols: list[str] | None = None,
     overwrite: bool = False,
-    compression: str = "snappy",
+    compression: str = "zstd",
+    compression_level: int | None = None,
+    use_dictionary: bool | list[str] = True,
+    downcast: bool = False,
+    schema: pa.Schema | None = None,
+    row_group_size: int = ROW_GROUP_SIZE,
+    data_page_size: int = DATA_PAGE_SIZE,
+    dictionary_page_size: int = DICTIONARY_PAGE_SIZE,
 ) -> Path:
-    """Grava DataFrame em Parquet.
+    """Grava DataFrame (ou pa.Table / pa.RecordBatchReader, sem passar pelo pandas) em Parquet.
     - Se partition_cols estiver definido, grava diretório particionado.
     - Caso contrário, grava um único arquivo <file_stem>.parquet.
+    - compression="auto" escolhe o codec por coluna (texto zstd, números snappy, bool sem);
+      compression_level vale para zstd/gzip/brotli (None: 3 no zstd, padrão do codec nos
+      demais); use_dictionary aceita lista de colunas.
+    - downcast=True grava int64/float64 no menor tipo que representa os valores sem perda.
+    - Colunas 100% nulas não são gravadas; os nomes ficam no metadata 'null_columns'.
+    - schema: schema Arrow fixo (ex.: reaproveitado entre lotes); usado como está, sem
+      dictionary automático nem downcast.
+    - row_group_size (linhas) / data_page_size / dictionary_page_size (bytes): row groups
+      menores dão mais granularidade ao pushdown por estatísticas na leitura.
+    - Com overwrite, grava _MANIFEST.json e pula a escrita se conteúdo/parâmetros não mudaram.
+    - Entrada Arrow mantém os tipos nativos (sem dictionary automático/downcast/remoção de
+      nulas); RecordBatchReader é gravado em streaming, lote a lote, sem manifest.
     Retorna o caminho de saída (diretório ou arquivo).
     """
     out_dir = Path(output_dir)
+    target = out_dir if partition_cols else out_dir / f"{file_stem}.parquet"
+    # Schema inferido uma vez (reaproveitado pelas fatias) já com as colunas dictionary
+    is_arrow = isinstance(df, (pa.Table, pa.RecordBatchReader))
+    if schema is None and is_arrow:
+        schema = df.schema
+    elif is_arrow and not df.schema.equals(schema):
+        df = df.cast(schema)  # Table de uma vez; RecordBatchReader lote a lote (lazy)
+    elif schema is None:
+        schema = _auto_dictionary(df, _infer_schema(df))
+        if downcast:
+            schema = _downcast(df, schema)
+        schema = _drop_null_columns(df, schema, keep=list(partition_cols or []))
 
-    if overwrite and out_dir.exists():
-        logger.info("Overwrite habilitado. Removendo diretório de saída: %s", out_dir)
-        shutil.rmtree(out_dir, ignore_errors=True)
+    opts = _parquet_options(compression, compression_level, use_dictionary,
+                            data_page_size, dictionary_page_size, schema=schema)
 
-    out_dir.mkdir(parents=True, exist_ok=True)
+    # Re-execução idempotente: com overwrite, conteúdo + parâmetros iguais ao manifest → não regrava
+    manifest = None
+    if overwrite and not isinstance(df, pa.RecordBatchReader):
+        manifest = _fingerprint(df, schema, {
+            "file_stem": file_stem,
+            "partition_cols": list(partition_cols or []),
+            "compression": compression,
+            "compression_level": compression_level,
+            "use_dictionary": use_dictionary,
+            "row_group_size": row_group_size,
+            "data_page_size": data_page_size,
+            "dictionary_page_size": dictionary_page_size,
+        })
+        if target.exists() and _read_manifest(out_dir) == manifest:
+            logger.info("Saída inalterada (manifest confere); gravação ignorada: %s", target)
+            return target
 
+    # Overwrite: grava num diretório temporário irmão e troca por rename no fim (atômico,
+    # sem rmtree síncrono antes da escrita); append grava direto em out_dir
+    if overwrite:
+        write_dir = out_dir.parent / f".{out_dir.name}.tmp.{os.getpid()}"
+        shutil.rmtree(write_dir, ignore_errors=True)  # sobra de execução interrompida
+    else:
+        write_dir = out_dir
+    write_dir.mkdir(parents=True, exist_ok=True)
+    if manifest is None:
+        # append muda o conteúdo do diretório: manifest antigo deixa de valer
+        (out_dir / MANIFEST_NAME).unlink(missing_ok=True)
+
+    try:
+        _write_parquet_into(df, write_dir, file_stem, partition_cols, schema, opts, compression,
+                            row_group_size)
+        if manifest is not None:
+            (write_dir / MANIFEST_NAME).write_text(json.dumps(manifest), encoding="utf-8")
+    except BaseException:
+        if write_dir != out_dir:
+            shutil.rmtree(write_dir, ignore_errors=True)
+        raise
+
+    if write_dir != out_dir:
+        _swap_dir(write_dir, out_dir)
+    return target
+
+def _swap_dir(new_dir: Path, out_dir: Path) -> None:
+    """Publica new_dir no lugar de out_dir via rename; o antigo é apagado em background."""
+    old = None
+    if out_dir.exists():
+        old = out_dir.parent / f".{out_dir.name}.old.{os.getpid()}"
+        shutil.rmtree(old, ignore_errors=True)
+        os.rename(out_dir, old)
+        logger.info("Overwrite habilitado. Substituindo diretório de saída: %s", out_dir)
+    os.rename(new_dir, out_dir)
+    if old is not None:
+        # não-daemon: o interpretador espera a limpeza terminar antes de sair
+        threading.Thread(target=shutil.rmtree, args=(old,), kwargs={"ignore_errors": True},
+                         name="etl-writer-rmtree").start()
+
+def _write_parquet_into(
+    df: pd.DataFrame | pa.Table | pa.RecordBatchReader,
+    out_dir: Path,
+    file_stem: str,
+    partition_cols: list[str] | None,
+    schema: pa.Schema,
+    opts: dict,
+    compression: str | None,
+    row_group_size: int,
+) -> None:
     if partition_cols:
         logger.info("Gravando Parquet particionado em '%s' | partitions=%s | compression=%s",
                     out_dir, partition_cols, compression)
-        df.to_parquet(
-            out_dir,
-            partition_cols=partition_cols,
-            index=False,
-            compression=compression,
-            engine="pyarrow",
+        # write_dataset controla row groups/arquivos; nome único por escrita preserva
+        # o comportamento de append do to_parquet quando overwrite=False
+        data = df if isinstance(df, (pa.Table, pa.RecordBatchReader)) else _to_arrow(df, schema)
+        ds.write_dataset(
+            data,
+            base_dir=str(out_dir),
+            format="parquet",
+            partitioning=ds.partitioning(
+                pa.schema([schema.field(c) for c in partition_cols]), flavor="hive"
+            ),
+            basename_template=f"{file_stem}-{uuid.uuid4().hex}-{{i}}.parquet",
+            existing_data_behavior="overwrite_or_ignore",
+            file_options=ds.ParquetFileFormat().make_write_options(**opts),
+            max_rows_per_file=max(MAX_ROWS_PER_FILE, row_group_size),
+            max_rows_per_group=row_group_size,
+            filesystem=_FS,
         )
-        return out_dir
     else:
-        file_path = out_dir / f"{file_stem}.parquet"
-        logger.info("Gravando Parquet em '%s' | compression=%s", file_path, compression)
-        df.to_parquet(
-            file_path,
-            index=False,
-            compression=compression,
-            engine="pyarrow",
-        )
-        return file_path
+        target = out_dir / f"{file_stem}.parquet"
+        logger.info("Gravando Parquet em '%s' | compression=%s", target, compression)
+        with _FS.open_output_stream(str(target), buffer_size=OUTPUT_BUFFER_SIZE) as sink, \
+                pq.ParquetWriter(sink, schema, **opts) as writer:
+            if isinstance(df, pa.Table):
+                writer.write_table(df, row_group_size=row_group_size)
+            elif isinstance(df, pa.RecordBatchReader):
+                for batch in df:  # streaming: um lote por vez em memória
+                    writer.write_batch(batch, row_group_size=row_group_size)
+            else:
+                _write_frame_slices(writer, df, schema, row_group_size)
+
+def _write_frame_slices(writer: pq.ParquetWriter, df: pd.DataFrame, schema: pa.Schema,
+                        row_group_size: int) -> None:
+    # Escrita em fatias: só WRITE_CHUNK_ROWS linhas viram Arrow por vez (pico de RAM
+    # limitado), todas com o schema do frame inteiro.
+    # Pipeline: a fatia seguinte é convertida numa thread enquanto a atual é
+    # codificada/comprimida pelo writer (C++, sem GIL) → no máximo 2 fatias em memória.
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        pending = None
+        for start in range(0, len(df), WRITE_CHUNK_ROWS):
+            nxt = pool.submit(_to_arrow, df.iloc[start:start + WRITE_CHUNK_ROWS], schema)
+            if pending is not None:
+                writer.write_table(pending.result(), row_group_size=row_group_size)
+            pending = nxt
+        if pending is not None:
+            writer.write_table(pending.result(), row_group_size=row_group_size)
+
+class ParquetAppender:
+    """Arquivo Parquet mantido aberto para receber lotes incrementais (um ou mais row
+    groups por write), sem regravar o arquivo inteiro a cada lote.
+    O footer (schema/estatísticas) só é escrito no close(); antes disso o arquivo não é
+    legível. close() também roda no atexit, caso o chamador não feche.
+    """
+
+    def __init__(
+        self,
+        path: str | Path,
+        schema: pa.Schema,
+        compression: str | None = "zstd",
+        compression_level: int | None = None,
+        use_dictionary: bool | list[str] = True,
+        row_group_size: int = ROW_GROUP_SIZE,
+    ) -> None:
+        self.path = Path(path)
+        self.schema = schema
+        self.rows = 0
+        self._row_group_size = row_group_size
+        opts = _parquet_options(compression, compression_level, use_dictionary, schema=schema)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._sink = _FS.open_output_stream(str(self.path), buffer_size=OUTPUT_BUFFER_SIZE)
+        self._writer: pq.ParquetWriter | None = pq.ParquetWriter(self._sink, schema, **opts)
+        atexit.register(self.close)
+        logger.info("Appender Parquet aberto em '%s' | compression=%s", self.path, compression)
+
+    def write(self, batch: pd.DataFrame | pa.Table | pa.RecordBatch) -> None:
+        """Acrescenta um lote (DataFrame convertido e Arrow com cast para o schema do appender)."""
+        if self._writer is None:
+            raise ValueError(f"Appender já fechado: {self.path}")
+        if isinstance(batch, pd.DataFrame):
+            batch = pa.RecordBatch.from_pandas(batch, schema=self.schema, preserve_index=False)
+        elif not batch.schema.equals(self.schema):
+            batch = batch.cast(self.schema)
+        if isinstance(batch, pa.RecordBatch):
+            self._writer.write_batch(batch, row_group_size=self._row_group_size)
+        else:
+            self._writer.write_table(batch, row_group_size=self._row_group_size)
+        self.rows += batch.num_rows
+
+    def close(self) -> None:
+        """Finaliza o footer e fecha o arquivo (idempotente)."""
+        if self._writer is None:
+            return
+        self._writer.close()
+        self._sink.close()
+        self._writer = None
+        atexit.unregister(self.close)
+        logger.info("Appender Parquet fechado: '%s' | linhas=%s", self.path, self.rows)
+
+    def __enter__(self) -> "ParquetAppender":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+def open_parquet_appender(
+    path: str | Path,
+    schema: pa.Schema | pd.DataFrame,
+    **kwargs,
+) -> ParquetAppender:
+    """Abre um ParquetAppender. `schema` pode ser um pa.Schema ou um DataFrame de exemplo
+    (schema inferido dele). kwargs: compression, compression_level, use_dictionary,
+    row_group_size."""
+    if isinstance(schema, pd.DataFrame):
+        schema = _infer_schema(schema)
+    return ParquetAppender(path, schema, **kwargs)
+
+def _encode_csv_chunks(df: pd.DataFrame, out: queue.Queue, stop: threading.Event,
+                       sep: str, date_format: str, chunksize: int) -> None:
+    """Thread codificadora: cada fatia vira um buffer CSV em UTF-8.
+    Formatação do próprio pandas (to_csv com date_format, sem cópia do frame), para a saída
+    de BI ficar idêntica à de sempre: aspas só quando necessário, floats com ".0",
+    True/False e segundos sem fração."""
+    try:
+        for i, start in enumerate(range(0, max(len(df), 1), chunksize)):
+            if stop.is_set():
+                return
+            text = df.iloc[start:start + chunksize].to_csv(
+                None, index=False, header=(i == 0), sep=sep, date_format=date_format)
+            out.put(text.encode("utf-8"))
+        out.put(_CSV_DONE)
+    except BaseException as e:  # repassa o erro para quem grava
+        out.put(e)
+
+def _writev_all(fd: int, bufs: list) -> None:
+    """Grava todos os buffers (writev trata vários por syscall; retoma escritas parciais)."""
+    views = [memoryview(b) for b in bufs if len(b)]
+    while views:
+        if hasattr(os, "writev"):
+            n = os.writev(fd, views[:_IOV_MAX])
+        else:  # Windows: sem writev
+            n = os.write(fd, views[0])
+        while views and n >= len(views[0]):
+            n -= len(views[0])
+            views.pop(0)
+        if n:
+            views[0] = views[0][n:]
+
+def _write_csv_pipelined(df: pd.DataFrame, path: Path, sep: str, date_format: str,
+                         chunksize: int, bom: bool) -> None:
+    # Fila limitada → backpressure: no máximo CSV_QUEUE_SIZE fatias codificadas em memória
+    chunks: queue.Queue = queue.Queue(maxsize=CSV_QUEUE_SIZE)
+    stop = threading.Event()
+    encoder = threading.Thread(target=_encode_csv_chunks, name="etl-writer-csv", daemon=True,
+                               args=(df, chunks, stop, sep, date_format, chunksize))
+    encoder.start()
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, "O_BINARY", 0), 0o666)
+    try:
+        pending = [codecs.BOM_UTF8] if bom else []
+        while True:
+            # junta o que já está pronto na fila num único writev
+            items = [chunks.get()]
+            while len(items) < _IOV_MAX:
+                try:
+                    items.append(chunks.get_nowait())
+                except queue.Empty:
+                    break
+            end = items.pop() if not isinstance(items[-1], bytes) else None
+            _writev_all(fd, pending + items)
+            pending = []
+            if isinstance(end, BaseException):
+                raise end
+            if end is _CSV_DONE:
+                break
+    finally:
+        stop.set()
+        while encoder.is_alive():  # destrava o encoder se parou na fila cheia
+            try:
+                chunks.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        os.close(fd)
 
 def write_csv(
     df: pd.DataFrame,
@@ -58,23 +520,30 @@ def write_csv(
     sep: str = ",",
     date_format: str = "%Y-%m-%d",
     encoding: str = "utf-8-sig",
+    chunksize: int = 262_144,
 ) -> Path:
     """Grava DataFrame em CSV pronto para BI.
     - Converte colunas datetime64 para string ISO (date_format).
     - encoding 'utf-8-sig' evita problema de acentuação no Excel/Windows.
+    - Grava em blocos de `chunksize` linhas (pico de memória limitado a um bloco).
     """
+    if chunksize <= 0:
+        raise ValueError(f"chunksize deve ser positivo (recebido: {chunksize}).")
     path = Path(output_path)
     path.parent.mkdir(parents=True, exist_ok=True)
 
     if path.exists() and not overwrite:
         raise FileExistsError(f"Arquivo já existe: {path}. Use overwrite=True.")
 
-    df_out = df.copy()
-    for col, dtype in df_out.dtypes.items():
-        if "datetime64" in str(dtype):
-            df_out[col] = df_out[col].dt.strftime(date_format)
-
     logger.info("Gravando CSV em '%s' | sep='%s'", path, sep)
-    df_out.to_csv(path, index=False, sep=sep, encoding=encoding)
+    if encoding.lower().replace("_", "-") in {"utf-8", "utf-8-sig", "utf8"}:
+        # Sem cópia do DataFrame: datas formatadas pelo to_csv (date_format) fatia a fatia.
+        # Em fatias de `chunksize` linhas (memória constante); cabeçalho só na primeira.
+        # Codificação numa thread, gravação (os.writev) nesta → encode e I/O se sobrepõem.
+        bom = encoding.lower().replace("_", "-") == "utf-8-sig"
+        _write_csv_pipelined(df, path, sep, date_format, chunksize, bom)
+    else:
+        df.to_csv(path, index=False, sep=sep, encoding=encoding, date_format=date_format,
+                  chunksize=chunksize)
     logger.info("CSV gravado com sucesso.")
-    return path
\ No newline at end of file
+    return path